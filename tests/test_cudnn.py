@@ -46,6 +46,66 @@ class CudnnTests(Tf2OnnxBackendTestBase):
         output_names_with_port = ["output:0"]
         self.run_test_case(func, feed_dict, input_names_with_port, output_names_with_port, rtol=1e-05, atol=1e-04)
 
+    @check_tf_max_version("1.15.0", "not supported in tf-2.0")
+    @skip_tf_cpu("only tf_gpu can run CudnnGPU")
+    @check_opset_min_version(10, "CudnnGRU")
+    def test_cudnngru_random_weights(self):
+        """ test contrib cudnn gru with distinct weights per gate """
+        seq_length = 3
+        batch_size = 5
+        input_size = 3
+        # stacked bidirectional layers take both directions as input in cudnn, which isn't supported
+        num_layers = 1
+        num_units = 3
+        num_dirs = 2
+        x_val = np.random.uniform(-1, 1, [seq_length, batch_size, input_size]).astype(np.float32)
+        h_val = np.random.uniform(-1, 1, [num_layers * num_dirs, batch_size, num_units]).astype(np.float32)
+
+        def func(x, h):
+            kernel_initializer = init_ops.random_uniform_initializer(-1.0, 1.0, seed=42)
+            bias_initializer = init_ops.random_uniform_initializer(-1.0, 1.0, seed=43)
+            cudnngru = tf.contrib.cudnn_rnn.CudnnGRU(num_layers, num_units, 'linear_input', 'bidirectional',
+                                                     kernel_initializer=kernel_initializer,
+                                                     bias_initializer=bias_initializer)
+            cudnngru.build([seq_length, batch_size, input_size])
+            outputs = cudnngru.call(x, tuple([h]))
+            _ = tf.identity(outputs[0], name='output')
+            _ = tf.identity(outputs[1][0], name='output_h')
+
+        feed_dict = {"input_1:0": x_val, "input_2:0": h_val}
+        input_names_with_port = ["input_1:0", "input_2:0"]
+        output_names_with_port = ["output:0", "output_h:0"]
+        self.run_test_case(func, feed_dict, input_names_with_port, output_names_with_port, rtol=1e-05, atol=1e-04)
+
+    @check_tf_max_version("1.15.0", "not supported in tf-2.0")
+    @skip_tf_cpu("only tf_gpu can run CudnnGPU")
+    @check_opset_min_version(10, "CudnnGRU")
+    def test_cudnngru_unidirectional_deep(self):
+        """ test contrib cudnn gru with a deep stack of layers """
+        seq_length = 3
+        batch_size = 5
+        input_size = 3
+        num_layers = 4
+        num_units = 3
+        x_val = np.random.uniform(-1, 1, [seq_length, batch_size, input_size]).astype(np.float32)
+        h_val = np.random.uniform(-1, 1, [num_layers, batch_size, num_units]).astype(np.float32)
+
+        def func(x, h):
+            kernel_initializer = init_ops.random_uniform_initializer(-1.0, 1.0, seed=42)
+            bias_initializer = init_ops.random_uniform_initializer(-1.0, 1.0, seed=43)
+            cudnngru = tf.contrib.cudnn_rnn.CudnnGRU(num_layers, num_units, 'linear_input', 'unidirectional',
+                                                     kernel_initializer=kernel_initializer,
+                                                     bias_initializer=bias_initializer)
+            cudnngru.build([seq_length, batch_size, input_size])
+            outputs = cudnngru.call(x, tuple([h]))
+            _ = tf.identity(outputs[0], name='output')
+            _ = tf.identity(outputs[1][0], name='output_h')
+
+        feed_dict = {"input_1:0": x_val, "input_2:0": h_val}
+        input_names_with_port = ["input_1:0", "input_2:0"]
+        output_names_with_port = ["output:0", "output_h:0"]
+        self.run_test_case(func, feed_dict, input_names_with_port, output_names_with_port, rtol=1e-05, atol=1e-04)
+
 
 if __name__ == '__main__':
     unittest_main()
@@ -123,6 +123,34 @@ class Tf2OnnxInternalTests(Tf2OnnxBackendTestBase):
                    'n5_raw_output___2:0 -> n5_graph_outputs_Identity__3 }'
         self.assertEqual(expected, result)
 
+    def test_get_or_make_const(self):
+        graph_proto = self.sample_net()
+        g = GraphUtil.create_graph_from_onnx_graph(graph_proto)
+        c1 = g.get_or_make_const("c", np.array([1., 2.], dtype=np.float32))
+        c2 = g.get_or_make_const("c", np.array([1., 2.], dtype=np.float32))
+        self.assertEqual(c1.output[0], c2.output[0])
+        c3 = g.get_or_make_const("c", np.array([1., 2.], dtype=np.float64))
+        self.assertNotEqual(c1.output[0], c3.output[0])
+        # a const changed in place must not be reused
+        c1.set_tensor_value(np.array([3., 4.], dtype=np.float32))
+        c4 = g.get_or_make_const("c", np.array([1., 2.], dtype=np.float32))
+        self.assertNotEqual(c1.output[0], c4.output[0])
+        # neither a removed one
+        g.remove_node(c4.name)
+        c5 = g.get_or_make_const("c", np.array([1., 2.], dtype=np.float32))
+        self.assertNotEqual(c4.output[0], c5.output[0])
+
+    def test_replace_all_inputs_multi(self):
+        graph_proto = self.sample_net()
+        g = GraphUtil.create_graph_from_onnx_graph(graph_proto)
+        # replacements are applied simultaneously, so inputs can be swapped
+        g.replace_all_inputs_multi(g.get_nodes(), {"n2:0": "n3:0", "n3:0": "n2:0", "n1:0": "input"})
+        self.assertEqual(g.get_node_by_name("n4").input, ["n3:0", "n2:0"])
+        self.assertEqual(g.get_node_by_name("n2").input, ["input"])
+        self.assertEqual(g.get_node_by_name("n3").input, ["input"])
+        with self.assertRaises(RuntimeError):
+            g.replace_all_inputs_multi(g.get_nodes(), {"input": "n2:0"})
+
     def test_rewrite_subgraph(self):
         graph_proto = self.sample_net()
         g = GraphUtil.create_graph_from_onnx_graph(graph_proto)
@@ -432,5 +432,118 @@ class LSTMBlockTests(Tf2OnnxBackendTestBase):
         output_names_with_port = ["output:0", "cell_state:0"]
         self.run_test_case(func, feed_dict, input_names_with_port, output_names_with_port, rtol=1e-03, atol=1e-06)
 
+    @check_opset_min_version(7, "LSTM")
+    @check_tf_max_version("1.15", "no LSTMBlockCell in tf-2.x")
+    def test_single_lstm_block_cell(self):
+        units = 5
+        batch_size = 6
+        x_val = np.random.randn(batch_size, 3).astype(np.float32)
+
+        def func(x):
+            cell = LSTMBlockCell(units)
+            state = cell.zero_state(batch_size, tf.float32)
+            output, state = cell(x, state)
+            return tf.identity(output, name="output"), tf.identity(state.c, name="cell_state")
+
+        input_names_with_port = ["input_1:0"]
+        feed_dict = {"input_1:0": x_val}
+        output_names_with_port = ["output:0", "cell_state:0"]
+        self.run_test_case(func, feed_dict, input_names_with_port, output_names_with_port, rtol=1e-05, atol=1e-06,
+                           graph_validator=lambda g: check_lstm_count(g, 1))
+
+    @check_tf_max_version("1.15", "no LSTMBlockCell in tf-2.x")
+    def test_lstm_block_cell_with_peephole_and_cell_clip(self):
+        units = 5
+        batch_size = 6
+        x_val = np.random.randn(batch_size, 3).astype(np.float32)
+
+        def func(x):
+            # cell_clip keeps the cell from being converted into onnx LSTM
+            cell = LSTMBlockCell(units, use_peephole=True, cell_clip=0.5)
+            state = cell.zero_state(batch_size, tf.float32)
+            output, state = cell(x, state)
+            output, state = cell(x, state)
+            return tf.identity(output, name="output"), tf.identity(state.c, name="cell_state")
+
+        input_names_with_port = ["input_1:0"]
+        feed_dict = {"input_1:0": x_val}
+        output_names_with_port = ["output:0", "cell_state:0"]
+        self.run_test_case(func, feed_dict, input_names_with_port, output_names_with_port, rtol=1e-05, atol=1e-06,
+                           graph_validator=lambda g: check_lstm_count(g, 0))
+
+    @check_tf_max_version("1.15", "no LSTMBlockCell in tf-2.x")
+    def test_lstm_block_cell_with_cell_clip(self):
+        units = 5
+        batch_size = 6
+        x_val = np.random.randn(batch_size, 3).astype(np.float32)
+
+        def func(x):
+            # cell_clip keeps the cell from being converted into onnx LSTM
+            cell = LSTMBlockCell(units, cell_clip=0.5)
+            state = cell.zero_state(batch_size, tf.float32)
+            output, state = cell(x, state)
+            output, state = cell(x, state)
+            return tf.identity(output, name="output"), tf.identity(state.c, name="cell_state")
+
+        input_names_with_port = ["input_1:0"]
+        feed_dict = {"input_1:0": x_val}
+        output_names_with_port = ["output:0", "cell_state:0"]
+        self.run_test_case(func, feed_dict, input_names_with_port, output_names_with_port, rtol=1e-05, atol=1e-06,
+                           graph_validator=lambda g: check_lstm_count(g, 0))
+
+    @check_opset_min_version(7, "LSTM")
+    @check_tf_max_version("1.15", "no LSTMBlockCell in tf-2.x")
+    def test_static_lstm_block_cell_chain(self):
+        units = 5
+        batch_size = 6
+        x_val = np.random.randn(batch_size, 4, 3).astype(np.float32)
+
+        def func(x):
+            cell = LSTMBlockCell(units, use_peephole=True)
+            outputs, state = tf.nn.static_rnn(cell, tf.unstack(x, axis=1), dtype=tf.float32)
+            return tf.identity(tf.stack(outputs, axis=1), name="output"), tf.identity(state.c, name="cell_state")
+
+        input_names_with_port = ["input_1:0"]
+        feed_dict = {"input_1:0": x_val}
+        output_names_with_port = ["output:0", "cell_state:0"]
+        self.run_test_case(func, feed_dict, input_names_with_port, output_names_with_port, rtol=1e-05, atol=1e-06,
+                           graph_validator=lambda g: check_lstm_count(g, 1))
+
+    @check_opset_min_version(7, "LSTM")
+    @check_tf_max_version("1.15", "no LSTMBlockCell in tf-2.x")
+    def test_static_lstm_block_cell_chain_without_peephole(self):
+        units = 5
+        batch_size = 6
+        x_val = np.random.randn(batch_size, 4, 3).astype(np.float32)
+
+        def func(x):
+            cell = LSTMBlockCell(units)
+            outputs, state = tf.nn.static_rnn(cell, tf.unstack(x, axis=1), dtype=tf.float32)
+            return tf.identity(tf.stack(outputs, axis=1), name="output"), tf.identity(state.c, name="cell_state")
+
+        input_names_with_port = ["input_1:0"]
+        feed_dict = {"input_1:0": x_val}
+        output_names_with_port = ["output:0", "cell_state:0"]
+        self.run_test_case(func, feed_dict, input_names_with_port, output_names_with_port, rtol=1e-05, atol=1e-06,
+                           graph_validator=lambda g: check_lstm_count(g, 1))
+
+    @check_opset_min_version(7, "LSTM")
+    @check_tf_max_version("1.15", "no LSTMBlockCell in tf-2.x")
+    def test_static_multi_rnn_lstm_block_cell_chain(self):
+        units = 5
+        batch_size = 6
+        x_val = np.random.randn(batch_size, 4, 3).astype(np.float32)
+
+        def func(x):
+            cells = MultiRNNCell([LSTMBlockCell(units), LSTMBlockCell(units)], state_is_tuple=True)
+            outputs, state = tf.nn.static_rnn(cells, tf.unstack(x, axis=1), dtype=tf.float32)
+            return tf.identity(tf.stack(outputs, axis=1), name="output"), tf.identity(state[1].c, name="cell_state")
+
+        input_names_with_port = ["input_1:0"]
+        feed_dict = {"input_1:0": x_val}
+        output_names_with_port = ["output:0", "cell_state:0"]
+        self.run_test_case(func, feed_dict, input_names_with_port, output_names_with_port, rtol=1e-05, atol=1e-06,
+                           graph_validator=lambda g: check_lstm_count(g, 2))
+
 if __name__ == '__main__':
     unittest_main()
@@ -11,6 +11,7 @@ from __future__ import unicode_literals
 
 import collections
 import copy
+import hashlib
 import logging
 import six
 import numpy as np
@@ -412,6 +413,7 @@ class Graph(object):
         self._is_subgraph = is_subgraph
         self.ta_reads = []
         self.func_inputs = []
+        self._const_cache = {}
 
         self._target = set(target)
         self._dtypes = dtypes
@@ -504,6 +506,21 @@ class Graph(object):
         self.set_dtype(name, utils.map_numpy_to_onnx_dtype(np_val.dtype))
         return node
 
+    def get_or_make_const(self, name, np_val):
+        """Return a const holding np_val, reusing an existing one made by this method if possible.
+        Args:
+            name: prefix of the const node name if a new const has to be made.
+            np_val: value of type numpy ndarray.
+        """
+        key = (np_val.dtype.str, np_val.shape, hashlib.sha1(np_val.tobytes()).hexdigest())
+        node = self.get_node_by_output_in_current_graph(self._const_cache.get(key))
+        # the cached const might have been removed or changed in place since it was made
+        if node is not None and node.is_const() and np.array_equal(node.get_tensor_value(as_list=False), np_val):
+            return node
+        node = self.make_const(utils.make_name(name), np_val)
+        self._const_cache[key] = node.output[0]
+        return node
+
     def copy_const(self, node, name=None):
         """Copy a const node, using name if specified"""
         # TODO: support attr copy starting at opset 12
@@ -1211,6 +1228,30 @@ class Graph(object):
                 for g in body_graphs.values():
                     g.replace_all_inputs(g.get_nodes(), old_input, new_input)
 
+    @staticmethod
+    def replace_all_inputs_multi(ops, remap):
+        """Replace all inputs found in remap (old input -> new input) with a single pass over ops.
+        The replacements are applied simultaneously, so they don't chain.
+        """
+        remap = {old_input: new_input for old_input, new_input in remap.items() if old_input != new_input}
+        if not remap:
+            return
+
+        for node in ops:
+            for i, input_name in enumerate(node.input):
+                new_input = remap.get(input_name)
+                if new_input is None:
+                    continue
+                if new_input in node.output:
+                    raise RuntimeError("creating a circle in the graph is not allowed: " + node.name)
+                node.input[i] = new_input
+
+            # modify references in sub graphs
+            body_graphs = node.get_body_graphs()
+            if body_graphs:
+                for g in body_graphs.values():
+                    g.replace_all_inputs_multi(g.get_nodes(), remap)
+
     @staticmethod
     def replace_input(node, old_input, new_input):
         """Replace node."""
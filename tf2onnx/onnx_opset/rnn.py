@@ -11,8 +11,11 @@ from __future__ import unicode_literals
 
 import logging
 import numpy as np
+from onnx import onnx_pb
 from tf2onnx import utils
 from tf2onnx.handler import tf_op
+from tf2onnx.rewriter.rnn_utils import get_weights_from_const_node, get_onnx_lstm_weights, get_onnx_lstm_peepholes, \
+    get_output_consumers, can_convert_lstm_block_cell_to_lstm
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +25,7 @@ logger = logging.getLogger(__name__)
 @tf_op("LSTMBlockCell")
 class LSTMBlockCell:
     @classmethod
-    def version_1(cls, ctx, node, **kwargs):
+    def version_1(cls, ctx, node, consumed_outputs=None, **kwargs):
         """
         Args:
           x: A `Tensor`. Must be one of the following types: `float32`.
@@ -70,104 +73,216 @@ class LSTMBlockCell:
         h = co .* o
         ```
         """
-        nodes = []
         x, cs_prev, h_prev, w, wci, wcf, wco, b = node.input
         forget_bias = float(node.get_attr("forget_bias").f)
         cell_clip = float(node.get_attr("cell_clip").f)
         use_peephole = bool(node.get_attr("use_peephole").i)
+        if consumed_outputs is None:
+            consumed_outputs = set(get_output_consumers(ctx)) | set(ctx.outputs)
 
-        def make_sigmoid(i, w, b):
-            i_w_node = ctx.make_node("Mul", [i, w])
-            i_w_b_node = ctx.make_node("Add", [i_w_node.output[0], b])
-            output_node = ctx.make_node("Sigmoid", [i_w_b_node.output[0]])
-            nodes.extend([i_w_node, i_w_b_node, output_node])
-            return output_node.output[0]
-
-        # xh = [x, h]
-        xh_node = ctx.make_node("Concat", [x, h_prev], attr={"axis": 1})
-
-        # i, ci, f, o = xh * w + b
-        xh_w_node = ctx.make_node("MatMul", [xh_node.output[0], w])
         w_shape = ctx.get_shape(w)
         if len(w_shape) != 2 or w_shape[1] % 4 != 0:
             raise RuntimeError("shape of W of LSTMBlockCell {} should be times of 4".format(node.name))
-        merged_output_node = ctx.make_node("Add", [xh_w_node.output[0], b])
         w_last_dim = int(w_shape[1] / 4)
-        split = [w_last_dim] * 4
-        split_output_node = ctx.make_node(
-            "Split", [merged_output_node.output[0]],
-            attr={"axis": 1, "split": split},
-            output_count=4
-        )
-        i, ci, f, o = split_output_node.output
+        prefix = node.name + "__"
 
-        # f = f + forget_bias
-        forget_bias_const = ctx.make_const(
-            utils.make_name("{}__forget_bias".format(node.name)),
-            np.array(forget_bias, dtype=np.float32)
-        )
-        f_node = ctx.make_node("Add", [f, forget_bias_const.output[0]])
+        # a const b gets forget_bias folded into it instead of adding it at runtime
+        b_node = ctx.get_node_by_output(b)
+        b_val = get_weights_from_const_node(ctx, b_node) if b_node else None
 
-        if not use_peephole:
-            zeros_const = ctx.make_const(
-                utils.make_name("{}__zeros_const".format(node.name)),
-                np.zeros([w_last_dim], dtype=np.float32)
-            )
-            nodes.append(zeros_const)
-            wci = zeros_const.output[0]
-            wcf = zeros_const.output[0]
-            wco = zeros_const.output[0]
-
-        # i = sigmoid(cs_prev .* wci + i)
-        i = make_sigmoid(cs_prev, wci, i)
-        # f = sigmoid(cs_prev .* wcf + f)
-        f = make_sigmoid(cs_prev, wcf, f_node.output[0])
-        # ci = Tanh(ci)
-        ci_node = ctx.make_node("Tanh", [ci])
-        # cs = ci .* i + f .* cs_prev
-        ci_i_node = ctx.make_node("Mul", [ci_node.output[0], i])
-        cs_prev_f_node = ctx.make_node("Mul", [cs_prev, f])
-        cs_node = ctx.make_node("Add", [ci_i_node.output[0], cs_prev_f_node.output[0]])
-        cs = cs_node.output[0]
-        # cs = clip(cs)
-        if cell_clip > 0:
-            if ctx.opset < 11:
-                cs_clip_node = ctx.make_node("Clip", [cs], attr={"max": cell_clip, "min": -cell_clip})
-                nodes.append(cs_clip_node)
-                cs = cs_clip_node.output[0]
+        # tensors are built lazily so that only outputs having consumers and their dependencies are emitted
+        cache = {}
+
+        def lazy(func):
+            def wrapper():
+                if func not in cache:
+                    cache[func] = func()
+                return cache[func]
+            return wrapper
+
+        def make_sigmoid(gate, cs=None, peephole_weight=None):
+            # sigmoid(cs .* peephole_weight + gate), without the peephole term if there is no weight
+            if peephole_weight is not None:
+                cs_w_node = ctx.make_node("Mul", [cs, peephole_weight])
+                gate = ctx.make_node("Add", [cs_w_node.output[0], gate]).output[0]
+            return ctx.make_node("Sigmoid", [gate]).output[0]
+
+        @lazy
+        def gates():
+            w_node = ctx.get_node_by_output(w)
+            w_val = get_weights_from_const_node(ctx, w_node) if w_node else None
+            if w_val is not None:
+                # xh * w = x * w_x + h * w_h, so x and h needn't be concatenated at runtime
+                w_x, w_h = np.split(w_val, [w_val.shape[0] - w_last_dim])
+                w_x_const = ctx.get_or_make_const(prefix + "w_x", w_x)
+                w_h_const = ctx.get_or_make_const(prefix + "w_h", w_h)
+                products = [(x, w_x_const.output[0]), (h_prev, w_h_const.output[0])]
             else:
-                dtype = utils.map_onnx_to_numpy_type(ctx.get_dtype(cs))
-                name_min = utils.make_name("{}_min".format(node.name))
-                name_max = utils.make_name("{}_max".format(node.name))
-                min_const = ctx.make_const(name_min, np.array(-cell_clip, dtype=dtype))
-                max_const = ctx.make_const(name_max, np.array(cell_clip, dtype=dtype))
-                cs_clip_node = ctx.make_node('Clip', [cs, min_const.output[0], max_const.output[0]])
-                nodes.append(cs_clip_node)
+                # xh = [x, h]
+                xh_node = ctx.make_node("Concat", [x, h_prev], attr={"axis": 1})
+                products = [(xh_node.output[0], w)]
+
+            # i, ci, f, o = xh * w + b
+            # Gemm broadcasts C since opset 7, b is accumulated into its C input directly
+            use_gemm = ctx.opset >= 7 and ctx.get_dtype(x) == onnx_pb.TensorProto.FLOAT
+            merged_output = b
+            if b_val is not None:
+                # gates are in icfo order
+                b_folded = b_val.copy()
+                b_folded[2 * w_last_dim:3 * w_last_dim] += forget_bias
+                merged_output = ctx.get_or_make_const(prefix + "b", b_folded).output[0]
+            for a, b_mat in products:
+                if use_gemm:
+                    gemm_node = ctx.make_node("Gemm", [a, b_mat, merged_output],
+                                              attr={"alpha": 1.0, "beta": 1.0, "transA": 0, "transB": 0})
+                    merged_output = gemm_node.output[0]
+                else:
+                    matmul_node = ctx.make_node("MatMul", [a, b_mat])
+                    add_node = ctx.make_node("Add", [matmul_node.output[0], merged_output])
+                    merged_output = add_node.output[0]
+            split = [w_last_dim] * 4
+            split_output_node = ctx.make_node(
+                "Split", [merged_output],
+                attr={"axis": 1, "split": split},
+                output_count=4
+            )
+            return split_output_node.output
+
+        @lazy
+        def input_gate():
+            # i = sigmoid(cs_prev .* wci + i)
+            return make_sigmoid(gates()[0], cs_prev, wci if use_peephole else None)
+
+        @lazy
+        def forget_gate():
+            f = gates()[2]
+            # f = f + forget_bias
+            if b_val is None:
+                forget_bias_val = np.array(forget_bias, dtype=np.float32)
+                forget_bias_const = ctx.get_or_make_const(prefix + "forget_bias", forget_bias_val)
+                f = ctx.make_node("Add", [f, forget_bias_const.output[0]]).output[0]
+            # f = sigmoid(cs_prev .* wcf + f)
+            return make_sigmoid(f, cs_prev, wcf if use_peephole else None)
+
+        @lazy
+        def cell_input():
+            # ci = Tanh(ci)
+            return ctx.make_node("Tanh", [gates()[1]]).output[0]
+
+        @lazy
+        def cell_state():
+            # cs = ci .* i + f .* cs_prev
+            ci_i_node = ctx.make_node("Mul", [cell_input(), input_gate()])
+            cs_prev_f_node = ctx.make_node("Mul", [cs_prev, forget_gate()])
+            cs_node = ctx.make_node("Add", [ci_i_node.output[0], cs_prev_f_node.output[0]])
+            cs = cs_node.output[0]
+            # cs = clip(cs)
+            if cell_clip > 0:
+                clip_inputs = [cs]
+                clip_attr = {}
+                # min and max of Clip are attributes before opset 11 and inputs since then
+                if ctx.opset < 11:
+                    clip_attr = {"max": cell_clip, "min": -cell_clip}
+                else:
+                    dtype = utils.map_onnx_to_numpy_type(ctx.get_dtype(cs))
+                    min_const = ctx.get_or_make_const(prefix + "min", np.array(-cell_clip, dtype=dtype))
+                    max_const = ctx.get_or_make_const(prefix + "max", np.array(cell_clip, dtype=dtype))
+                    clip_inputs.extend([min_const.output[0], max_const.output[0]])
+                cs_clip_node = ctx.make_node("Clip", clip_inputs, attr=clip_attr)
                 cs = cs_clip_node.output[0]
+            return cs
 
-        # o = cs * wco + o
-        o = make_sigmoid(cs, wco, o)
-        # co = Tanh(cs)
-        co_node = ctx.make_node("Tanh", [cs])
-        # h = co .* o
-        h_node = ctx.make_node("Mul", [co_node.output[0], o])
+        @lazy
+        def output_gate():
+            # o = sigmoid(cs * wco + o)
+            if use_peephole:
+                return make_sigmoid(gates()[3], cell_state(), wco)
+            return make_sigmoid(gates()[3])
 
-        def replace_output(old_output, new_output):
-            ctx.replace_all_inputs(ctx.get_nodes(), old_output, new_output)
-            ctx.copy_dtype(old_output, new_output)
-            ctx.copy_shape(old_output, new_output)
+        @lazy
+        def cell_output():
+            # co = Tanh(cs)
+            return ctx.make_node("Tanh", [cell_state()]).output[0]
 
-        replace_output(node.output[0], i)
-        replace_output(node.output[1], cs)
-        replace_output(node.output[2], f)
-        replace_output(node.output[3], o)
-        replace_output(node.output[4], ci_node.output[0])
-        replace_output(node.output[5], co_node.output[0])
-        replace_output(node.output[6], h_node.output[0])
+        @lazy
+        def hidden_output():
+            # h = co .* o
+            return ctx.make_node("Mul", [cell_output(), output_gate()]).output[0]
+
+        # all outputs are [batch_size, num_units] tensors of the same type, so look them up only once
+        dtype = ctx.get_dtype(node.output[0])
+        shape = ctx.get_shape(node.output[0])
+        # same order as outputs of LSTMBlockCell: i, cs, f, o, ci, co, h
+        makers = [input_gate, cell_state, forget_gate, output_gate, cell_input, cell_output, hidden_output]
+        remap = {}
+        for old_output, make_output in zip(node.output, makers):
+            if old_output in consumed_outputs:
+                remap[old_output] = make_output()
+        ctx.replace_all_inputs_multi(ctx.get_nodes(), remap)
+        for new_output in remap.values():
+            ctx.set_dtype(new_output, dtype)
+            if shape is not None:
+                ctx.set_shape(new_output, shape)
 
     @classmethod
     def version_7(cls, ctx, node, **kwargs):
-        cls.version_1(ctx, node, **kwargs)
+        # scanning the graph for consumers is expensive, so do it once for both conversions
+        consumed_outputs = set(get_output_consumers(ctx)) | set(ctx.outputs)
+        if not cls._make_lstm(ctx, node, consumed_outputs):
+            cls.version_1(ctx, node, consumed_outputs=consumed_outputs, **kwargs)
+
+    @classmethod
+    def _make_lstm(cls, ctx, node, consumed_outputs):
+        """Convert the cell into a single onnx LSTM with seq_length 1 when possible.
+        Returns False if the cell can't be mapped to LSTM and nothing is created.
+        """
+        x, cs_prev, h_prev, w, wci, wcf, wco, b = node.input
+        forget_bias = float(node.get_attr("forget_bias").f)
+        use_peephole = bool(node.get_attr("use_peephole").i)
+        prefix = node.name + "__"
+
+        if not can_convert_lstm_block_cell_to_lstm(node, consumed_outputs):
+            return False
+
+        weights = []
+        for inp in [w, b, wci, wcf, wco] if use_peephole else [w, b]:
+            inp_node = ctx.get_node_by_output(inp)
+            val = get_weights_from_const_node(ctx, inp_node) if inp_node else None
+            if val is None:
+                return False
+            weights.append(val)
+
+        w_val, b_val = weights[:2]
+        if len(w_val.shape) != 2 or w_val.shape[1] % 4 != 0 or b_val.shape != (w_val.shape[1],):
+            return False
+        lstm_w, lstm_r, lstm_b = get_onnx_lstm_weights(w_val, b_val, np.array(forget_bias, dtype=b_val.dtype))
+        hidden_size = lstm_r.shape[2]
+
+        # unrolled cells usually share weights, so are the converted consts
+        w_const = ctx.get_or_make_const(prefix + "W", lstm_w)
+        r_const = ctx.get_or_make_const(prefix + "R", lstm_r)
+        b_const = ctx.get_or_make_const(prefix + "B", lstm_b)
+        x_node = ctx.make_node("Unsqueeze", [x], attr={"axes": [0]})
+        h_prev_node = ctx.make_node("Unsqueeze", [h_prev], attr={"axes": [0]})
+        cs_prev_node = ctx.make_node("Unsqueeze", [cs_prev], attr={"axes": [0]})
+        lstm_inputs = [x_node.output[0], w_const.output[0], r_const.output[0], b_const.output[0], "",
+                       h_prev_node.output[0], cs_prev_node.output[0]]
+        if use_peephole:
+            wci_val, wcf_val, wco_val = weights[2:]
+            p_const = ctx.get_or_make_const(prefix + "P", get_onnx_lstm_peepholes(wci_val, wcf_val, wco_val))
+            lstm_inputs.append(p_const.output[0])
+
+        lstm_node = ctx.make_node("LSTM", lstm_inputs, attr={"direction": "forward", "hidden_size": hidden_size},
+                                  output_count=3)
+        h_node = ctx.make_node("Squeeze", [lstm_node.output[1]], attr={"axes": [0]})
+        cs_node = ctx.make_node("Squeeze", [lstm_node.output[2]], attr={"axes": [0]})
+
+        remap = {node.output[1]: cs_node.output[0], node.output[6]: h_node.output[0]}
+        ctx.replace_all_inputs_multi(ctx.get_nodes(), remap)
+        for old_output, new_output in remap.items():
+            ctx.copy_dtype(old_output, new_output)
+            ctx.copy_shape(old_output, new_output)
+        return True
 
 
 @tf_op("CudnnRNN")
@@ -196,60 +311,96 @@ class CudnnRNN:
         num_units = hidden_size = h_shape[2]
         input_size = x_shape[2]
         w_shape = [num_layers * num_dirs, 3 * hidden_size, input_size]
-        w_shape_const = ctx.make_const(utils.make_name("w_shape"), np.array(w_shape, dtype=np.int64))
         r_shape = [num_layers * num_dirs, 3 * hidden_size, hidden_size]
-        r_shape_const = ctx.make_const(utils.make_name("r_shape"), np.array(r_shape, dtype=np.int64))
         b_shape = [num_layers * num_dirs, 6 * hidden_size]
-        b_shape_const = ctx.make_const(utils.make_name("b_shape"), np.array(b_shape, dtype=np.int64))
-        zero_const = ctx.make_const(utils.make_name("zero"), np.array([0], dtype=np.int64))
         w_end = np.prod(w_shape)
-        w_end_const = ctx.make_const(utils.make_name("w_end"), np.array([w_end], dtype=np.int64))
         r_end = w_end + np.prod(r_shape)
-        r_end_const = ctx.make_const(utils.make_name("r_end"), np.array([r_end], dtype=np.int64))
         b_end = r_end + np.prod(b_shape)
-        b_end_const = ctx.make_const(utils.make_name("b_end"), np.array([b_end], dtype=np.int64))
-
-        def name(nm):
-            return node.name + "_" + nm
-
-        ws = [name('W_' + str(i)) for i in range(num_layers * num_dirs)]
-        rs = [name('R_' + str(i)) for i in range(num_layers * num_dirs)]
-        bs = [name('B_' + str(i)) for i in range(num_layers * num_dirs)]
-        hs = [name('H_' + str(i)) for i in range(num_layers * num_dirs)]
-        yhs = [name('YH_' + str(i)) for i in range(num_layers * num_dirs)]
-        w_flattened = ctx.make_node('Slice', [p, zero_const.output[0], w_end_const.output[0]])
-        r_flattened = ctx.make_node('Slice', [p, w_end_const.output[0], r_end_const.output[0]])
-        b_flattened = ctx.make_node('Slice', [p, r_end_const.output[0], b_end_const.output[0]])
-        w = utils.make_name('W')
-        r = utils.make_name('R')
-        b = utils.make_name('B')
-        ctx.make_node('Reshape', [w_flattened.output[0], w_shape_const.output[0]], outputs=[w])
-        ctx.make_node('Reshape', [r_flattened.output[0], r_shape_const.output[0]], outputs=[r])
-        ctx.make_node('Reshape', [b_flattened.output[0], b_shape_const.output[0]], outputs=[b])
-        ctx.make_node('Split', [w], outputs=ws)
-        ctx.make_node('Split', [r], outputs=rs)
-        ctx.make_node('Split', [b], outputs=bs)
-        ctx.make_node('Split', [h], outputs=hs)
+
+        prefix = node.name + "_"
+        # per layer tensors, in the layer (and direction) order of the cudnn params
+        ws, rs, bs, hs, ys, yhs = [], [], [], [], [], []
+        for i in range(num_layers * num_dirs):
+            suffix = "_" + str(i)
+            ws.append(prefix + "W" + suffix)
+            rs.append(prefix + "R" + suffix)
+            bs.append(prefix + "B" + suffix)
+            hs.append(prefix + "H" + suffix)
+            ys.append(prefix + "Y" + suffix)
+            yhs.append(prefix + "YH" + suffix)
+
+        # cudnn orders the gates as r, z, h while onnx GRU expects z, r, h
+        gate_perm = np.concatenate([np.arange(hidden_size, 2 * hidden_size), np.arange(hidden_size),
+                                    np.arange(2 * hidden_size, 3 * hidden_size)])
+        # cudnn bias is the input bias followed by the recurrent bias
+        b_perm = np.concatenate([gate_perm, gate_perm + 3 * hidden_size])
+
+        p_node = ctx.get_node_by_output(p)
+        p_val = get_weights_from_const_node(ctx, p_node) if p_node else None
+        if p_val is not None:
+            # params are weights in practice, so slice them at conversion time instead of at runtime
+            w_val = p_val[:w_end].reshape(w_shape)[:, gate_perm]
+            r_val = p_val[w_end:r_end].reshape(r_shape)[:, gate_perm]
+            b_val = p_val[r_end:b_end].reshape(b_shape)[:, b_perm]
+            for names, val in [(ws, w_val), (rs, r_val), (bs, b_val)]:
+                for nm, slab in zip(names, np.split(val, num_layers * num_dirs)):
+                    ctx.make_const(nm, slab)
+        else:
+            w_shape_const = ctx.make_const(utils.make_name(prefix + "w_shape"), np.array(w_shape, dtype=np.int64))
+            r_shape_const = ctx.make_const(utils.make_name(prefix + "r_shape"), np.array(r_shape, dtype=np.int64))
+            b_shape_const = ctx.make_const(utils.make_name(prefix + "b_shape"), np.array(b_shape, dtype=np.int64))
+            if ctx.get_shape(p) == [b_end]:
+                # params hold nothing but W, R and B, so a single Split carves all of them
+                split_attr = {'axis': 0, 'split': [int(w_end), int(r_end - w_end), int(b_end - r_end)]}
+                w_flattened, r_flattened, b_flattened = ctx.make_node('Split', [p], attr=split_attr,
+                                                                      output_count=3).output
+            else:
+                zero_const = ctx.make_const(utils.make_name(prefix + "zero"), np.array([0], dtype=np.int64))
+                w_end_const = ctx.make_const(utils.make_name(prefix + "w_end"), np.array([w_end], dtype=np.int64))
+                r_end_const = ctx.make_const(utils.make_name(prefix + "r_end"), np.array([r_end], dtype=np.int64))
+                b_end_const = ctx.make_const(utils.make_name(prefix + "b_end"), np.array([b_end], dtype=np.int64))
+                w_flattened = ctx.make_node('Slice', [p, zero_const.output[0], w_end_const.output[0]]).output[0]
+                r_flattened = ctx.make_node('Slice', [p, w_end_const.output[0], r_end_const.output[0]]).output[0]
+                b_flattened = ctx.make_node('Slice', [p, r_end_const.output[0], b_end_const.output[0]]).output[0]
+            w = ctx.make_node('Reshape', [w_flattened, w_shape_const.output[0]])
+            r = ctx.make_node('Reshape', [r_flattened, r_shape_const.output[0]])
+            b = ctx.make_node('Reshape', [b_flattened, b_shape_const.output[0]])
+            gate_perm_const = ctx.make_const(utils.make_name(prefix + "gate_perm"), gate_perm.astype(np.int64))
+            b_perm_const = ctx.make_const(utils.make_name(prefix + "b_perm"), b_perm.astype(np.int64))
+            w = ctx.make_node('Gather', [w.output[0], gate_perm_const.output[0]], attr={'axis': 1})
+            r = ctx.make_node('Gather', [r.output[0], gate_perm_const.output[0]], attr={'axis': 1})
+            b = ctx.make_node('Gather', [b.output[0], b_perm_const.output[0]], attr={'axis': 1})
+            ctx.make_node('Split', [w.output[0]], outputs=ws)
+            ctx.make_node('Split', [r.output[0]], outputs=rs)
+            ctx.make_node('Split', [b.output[0]], outputs=bs)
+        h_node = ctx.get_node_by_output(h)
+        h_val = get_weights_from_const_node(ctx, h_node) if h_node else None
+        if h_val is not None:
+            # a const initial state (usually zeros) is split at conversion time as well
+            for nm, slab in zip(hs, np.split(h_val, num_layers * num_dirs)):
+                ctx.make_const(nm, slab)
+        else:
+            ctx.make_node('Split', [h], outputs=hs)
         xnf = xnb = x
         for i in range(num_layers):
-            suffix = '_' + str(i * num_dirs)
-            ctx.make_node('GRU',
-                          [xnf, name('W' + suffix), name('R' + suffix), name('B' + suffix), '', name('H' + suffix)],
-                          outputs=[name('Y' + suffix), name('YH' + suffix)],
-                          attr={'direction': 'forward', 'hidden_size': num_units})
-            xnf = name(x + suffix)
-            ctx.make_node('Squeeze', [name('Y' + suffix)], outputs=[xnf], attr={'axes': [1]})
+            k = i * num_dirs
+            ctx.make_node('GRU', [xnf, ws[k], rs[k], bs[k], '', hs[k]], outputs=[ys[k], yhs[k]],
+                          attr={'direction': 'forward', 'hidden_size': num_units, 'linear_before_reset': 1})
+            xnf = ys[k]
+            if i < num_layers - 1:
+                # Y has a num_directions axis that the next layer's input must not have
+                xnf = ctx.make_node('Squeeze', [xnf], attr={'axes': [1]}).output[0]
             if num_dirs == 2:
-                suffix = '_' + str(i * 2 + 1)
-                ctx.make_node('GRU',
-                              [xnb, name('W' + suffix), name('R' + suffix), name('B' + suffix), '', name('H' + suffix)],
-                              outputs=[name('Y' + suffix), name('YH' + suffix)],
-                              attr={'direction': 'reverse', 'hidden_size': num_units})
-                xnb = name(x + suffix)
-                ctx.make_node('Squeeze', [name('Y' + suffix)], outputs=[xnb], attr={'axes': [1]})
+                k = i * 2 + 1
+                ctx.make_node('GRU', [xnb, ws[k], rs[k], bs[k], '', hs[k]], outputs=[ys[k], yhs[k]],
+                              attr={'direction': 'reverse', 'hidden_size': num_units, 'linear_before_reset': 1})
+                xnb = ys[k]
+                if i < num_layers - 1:
+                    xnb = ctx.make_node('Squeeze', [xnb], attr={'axes': [1]}).output[0]
         ctx.remove_node(node.name)
+        # the last layer is squeezed only once, after the directions are joined
+        y = xnf
         if num_dirs == 2:
-            ctx.make_node('Concat', [xnf, xnb], outputs=[node.output[0]], attr={'axis': -1})
-        else:
-            ctx.make_node('Identity', [xnf], outputs=[node.output[0]])
+            y = ctx.make_node('Concat', [xnf, xnb], attr={'axis': -1}).output[0]
+        ctx.make_node('Squeeze', [y], outputs=[node.output[0]], attr={'axes': [1]})
         ctx.make_node('Concat', yhs, outputs=[node.output[1]], attr={'axis': 0})
@@ -13,6 +13,7 @@ from tf2onnx.rewriter.eye_rewriter import rewrite_eye
 from tf2onnx.rewriter.flatten_rewriter import rewrite_flatten
 from tf2onnx.rewriter.gemm_rewriter import rewrite_gemm
 from tf2onnx.rewriter.leakyrelu_rewriter import rewrite_leakyrelu
+from tf2onnx.rewriter.lstm_block_cell_chain_rewriter import rewrite_lstm_block_cell_chain
 from tf2onnx.rewriter.random_normal_rewriter import rewrite_random_normal
 from tf2onnx.rewriter.random_uniform import rewrite_random_uniform, rewrite_random_uniform_fold_const
 from tf2onnx.rewriter.rnn import rewrite_single_direction_lstm, rewrite_bi_direction_lstm, \
@@ -32,6 +33,7 @@ __all__ = [
     "rewrite_flatten",
     "rewrite_gemm",
     "rewrite_leakyrelu",
+    "rewrite_lstm_block_cell_chain",
     "rewrite_random_normal",
     "rewrite_random_uniform",
     "rewrite_random_uniform_fold_const",
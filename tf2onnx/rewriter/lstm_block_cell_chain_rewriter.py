@@ -0,0 +1,240 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+"""
+tf2onnx.rewriter.lstm_block_cell_chain_rewriter - lift chains of unrolled LSTMBlockCell into a single onnx LSTM
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+import numpy as np
+from tf2onnx.rewriter.rnn_utils import get_weights_from_const_node, get_onnx_lstm_weights, get_onnx_lstm_peepholes, \
+    get_output_consumers, can_convert_lstm_block_cell_to_lstm
+
+# pylint: disable=invalid-name,unused-argument,missing-docstring
+
+
+logger = logging.getLogger(__name__)
+
+
+def _is_consumed(g, consumers, output):
+    return output in consumers or output in g.outputs
+
+
+def _get_cell_signature(g, cell, consumed_outputs):
+    """Return what cells in the same chain must share, or None if the cell can't be part of an onnx LSTM."""
+    if not can_convert_lstm_block_cell_to_lstm(cell, consumed_outputs):
+        return None
+
+    use_peephole = bool(cell.get_attr_value("use_peephole", 0))
+    weight_inputs = cell.input[3:] if use_peephole else [cell.input[3], cell.input[7]]
+    for inp in weight_inputs:
+        inp_node = g.get_node_by_output(inp)
+        if not inp_node or get_weights_from_const_node(g, inp_node) is None:
+            return None
+
+    # tf makes new zero peepholes for every step when they are not used, so only the used weights count
+    return tuple(weight_inputs), cell.get_attr_value("forget_bias", 1.0), use_peephole
+
+
+def _get_prev_cell(g, cell, consumers):
+    """Return the cell whose cs and h feed this cell, if its cs has no other consumer."""
+    prev = g.get_node_by_output(cell.input[1])
+    if not prev or prev.type != "LSTMBlockCell":
+        return None
+    if cell.input[1] != prev.output[1] or cell.input[2] != prev.output[6] or prev.output[1] in g.outputs:
+        return None
+    # cs of intermediate steps is not produced by onnx LSTM
+    if len(consumers.get(prev.output[1], [])) != 1 or cell.input.count(prev.output[1]) != 1:
+        return None
+    return prev
+
+
+def _depends_on(g, outputs, nodes):
+    """Whether any of outputs is computed from any of nodes."""
+    names = set(n.name for n in nodes)
+    visited = set()
+    stack = [g.get_node_by_output(output) for output in outputs]
+    while stack:
+        node = stack.pop()
+        if not node or node.name in visited:
+            continue
+        if node.name in names:
+            return True
+        visited.add(node.name)
+        stack.extend(g.get_node_by_output(inp) for inp in node.input)
+    return False
+
+
+def _make_sequence_input(g, chain, fused_steps):
+    """Make the [seq_length, batch_size, input_size] input of the LSTM from the x of each cell."""
+    xs = [cell.input[0] for cell in chain]
+    # stacked layers take the h of every step of a fused chain, whose squeezed Y holds them already
+    steps = [fused_steps.get(x) for x in xs]
+    y = steps[0][0] if steps[0] else None
+    if y and steps == [(y, t, len(xs)) for t in range(len(xs))]:
+        return y
+
+    unpack = g.get_node_by_output(xs[0])
+    if unpack and unpack.type == "Unpack" and list(unpack.output) == xs:
+        x_shape = g.get_shape(unpack.input[0])
+        axis = unpack.get_attr_value("axis", 0)
+        if x_shape and axis < 0:
+            axis += len(x_shape)
+        # the steps were unpacked from a tensor already, use it directly
+        if axis == 0:
+            return unpack.input[0]
+        if axis == 1 and x_shape and len(x_shape) == 3:
+            transpose = g.make_node("Transpose", [unpack.input[0]], attr={"perm": [1, 0, 2]},
+                                    shapes=[[x_shape[1], x_shape[0], x_shape[2]]],
+                                    dtypes=[g.get_dtype(unpack.input[0])])
+            return transpose.output[0]
+
+    unsqueezes = []
+    for x in xs:
+        x_shape = g.get_shape(x)
+        unsqueeze = g.make_node("Unsqueeze", [x], attr={"axes": [0]},
+                                shapes=[[1] + x_shape if x_shape else None], dtypes=[g.get_dtype(x)])
+        unsqueezes.append(unsqueeze.output[0])
+    concat = g.make_node("Concat", unsqueezes, attr={"axis": 0}, dtypes=[g.get_dtype(xs[0])])
+    return concat.output[0]
+
+
+def _sort_chains(g, chains):
+    """Sort chains so that a chain taking its x from the cells of other chains comes after them."""
+    chain_index = {cell.name: i for i, chain in enumerate(chains) for cell in chain}
+    visited = set()
+    sorted_chains = []
+
+    def visit(i):
+        if i in visited:
+            return
+        visited.add(i)
+        for cell in chains[i]:
+            x_node = g.get_node_by_output(cell.input[0])
+            if x_node and x_node.name in chain_index:
+                visit(chain_index[x_node.name])
+        sorted_chains.append(chains[i])
+
+    for i in range(len(chains)):
+        visit(i)
+    return sorted_chains
+
+
+def _fuse_chain(g, chain, consumers, fused_steps):
+    head, tail = chain[0], chain[-1]
+    use_peephole = bool(head.get_attr_value("use_peephole", 0))
+    forget_bias = head.get_attr_value("forget_bias", 1.0)
+    _, cs_prev, h_prev, w, wci, wcf, wco, b = head.input
+    w_val = get_weights_from_const_node(g, g.get_node_by_output(w))
+    b_val = get_weights_from_const_node(g, g.get_node_by_output(b))
+    if len(w_val.shape) != 2 or w_val.shape[1] % 4 != 0 or b_val.shape != (w_val.shape[1],):
+        return False
+    # x of a step must not be computed from the outputs of previous steps, as in a decoder
+    if _depends_on(g, [cell.input[0] for cell in chain[1:]], chain):
+        return False
+
+    W, R, B = get_onnx_lstm_weights(w_val, b_val, np.array(forget_bias, dtype=b_val.dtype))
+    hidden_size = R.shape[2]
+    dtype = g.get_dtype(head.output[6])
+    h_shape = g.get_shape(head.output[6])
+    batch_size = h_shape[0] if h_shape else -1
+    seq_length = len(chain)
+    logger.debug("fuse chain of %d LSTMBlockCell from %s into a LSTM", seq_length, head.name)
+
+    prefix = head.name + "__"
+    lstm_inputs = [_make_sequence_input(g, chain, fused_steps), g.get_or_make_const(prefix + "W", W).output[0],
+                   g.get_or_make_const(prefix + "R", R).output[0], g.get_or_make_const(prefix + "B", B).output[0], ""]
+    for state in [h_prev, cs_prev]:
+        unsqueeze = g.make_node("Unsqueeze", [state], attr={"axes": [0]},
+                                shapes=[[1, batch_size, hidden_size]], dtypes=[dtype])
+        lstm_inputs.append(unsqueeze.output[0])
+    if use_peephole:
+        wci_val, wcf_val, wco_val = [get_weights_from_const_node(g, g.get_node_by_output(p)) for p in [wci, wcf, wco]]
+        p = get_onnx_lstm_peepholes(wci_val, wcf_val, wco_val)
+        lstm_inputs.append(g.get_or_make_const(prefix + "P", p).output[0])
+
+    lstm = g.make_node("LSTM", lstm_inputs, attr={"direction": "forward", "hidden_size": hidden_size},
+                       output_count=3, op_name_scope=head.name,
+                       shapes=[[seq_length, 1, batch_size, hidden_size], [1, batch_size, hidden_size],
+                               [1, batch_size, hidden_size]],
+                       dtypes=[dtype, dtype, dtype])
+
+    remap = {}
+    if _is_consumed(g, consumers, tail.output[1]):
+        cs = g.make_node("Squeeze", [lstm.output[2]], attr={"axes": [0]},
+                         shapes=[[batch_size, hidden_size]], dtypes=[dtype])
+        remap[tail.output[1]] = cs.output[0]
+    if _is_consumed(g, consumers, tail.output[6]):
+        h = g.make_node("Squeeze", [lstm.output[1]], attr={"axes": [0]},
+                        shapes=[[batch_size, hidden_size]], dtypes=[dtype])
+        remap[tail.output[6]] = h.output[0]
+    # h of intermediate steps only counts if consumed outside of the chain
+    chain_names = set(cell.name for cell in chain)
+    steps = [t for t, cell in enumerate(chain[:-1]) if cell.output[6] in g.outputs or
+             any(c.name not in chain_names for c in consumers.get(cell.output[6], []))]
+    if steps:
+        y = g.make_node("Squeeze", [lstm.output[0]], attr={"axes": [1]},
+                        shapes=[[seq_length, batch_size, hidden_size]], dtypes=[dtype])
+        split = g.make_node("Split", [y.output[0]], attr={"axis": 0}, output_count=seq_length,
+                            shapes=[[1, batch_size, hidden_size]] * seq_length, dtypes=[dtype] * seq_length)
+        for t in steps:
+            h = g.make_node("Squeeze", [split.output[t]], attr={"axes": [0]},
+                            shapes=[[batch_size, hidden_size]], dtypes=[dtype])
+            remap[chain[t].output[6]] = h.output[0]
+        # remember where the h of each step is in Y, for the chain of a layer stacked on this one
+        for t in steps + [seq_length - 1]:
+            if chain[t].output[6] in remap:
+                fused_steps[remap[chain[t].output[6]]] = (y.output[0], t, seq_length)
+
+    for cell in chain:
+        g.remove_node(cell.name)
+    g.replace_all_inputs_multi(g.get_nodes(), remap)
+    return True
+
+
+def rewrite_lstm_block_cell_chain(g, ops):
+    # a single cell is converted into LSTM by its handler since opset 7
+    if g.opset < 7:
+        return ops
+
+    # consumers are collected once; fusing a chain only removes consumers or adds ones of tensors
+    # that were consumed already, so the map stays a safe superset while chains are fused
+    consumers = get_output_consumers(g)
+    consumed_outputs = set(consumers) | set(g.outputs)
+    signatures = {}
+    for op in ops:
+        if op.type == "LSTMBlockCell":
+            signature = _get_cell_signature(g, op, consumed_outputs)
+            if signature is not None:
+                signatures[op.name] = signature
+
+    next_cells = {}
+    for name, signature in signatures.items():
+        cell = g.get_node_by_name(name)
+        prev = _get_prev_cell(g, cell, consumers)
+        if prev and signatures.get(prev.name) == signature:
+            next_cells[prev.name] = cell
+
+    chains = []
+    chained = set(cell.name for cell in next_cells.values())
+    for name in signatures:
+        if name in chained or name not in next_cells:
+            continue
+        chain = [g.get_node_by_name(name)]
+        while chain[-1].name in next_cells:
+            chain.append(next_cells[chain[-1].name])
+        chains.append(chain)
+
+    fused = False
+    # h of the steps of fused chains, mapped to (Y, step, seq_length) of their LSTM
+    fused_steps = {}
+    for chain in _sort_chains(g, chains):
+        fused = _fuse_chain(g, chain, consumers, fused_steps) or fused
+
+    if fused:
+        return g.get_nodes()
+    return ops
@@ -13,7 +13,7 @@ import logging
 import numpy as np
 from tf2onnx import utils
 from tf2onnx.graph_builder import GraphBuilder
-from tf2onnx.rewriter.rnn_utils import RNNUnitType, get_weights_from_const_node
+from tf2onnx.rewriter.rnn_utils import RNNUnitType, get_weights_from_const_node, get_onnx_lstm_weights
 from tf2onnx.utils import is_tf_concat_op, is_tf_slice_op
 
 from tf2onnx.rewriter.lstm_rewriter_base import LSTMRewriterBase
@@ -223,42 +223,9 @@ class LSTMRewriter(LSTMRewriterBase):
 
     def process_weights_and_bias_per_layer(self, context, i):
         weights = context.weights[i]
-        w_r_icfo = weights["weight"]
-        w_dtype = weights["weight"].dtype
-        b_r_icfo = weights["bias"]
-        b_dtype = weights["bias"].dtype
-        ft_bias_scalar = weights["ft_bias"]
-
-        # split bias for each hidden unit
-        # b_r_icfo: (4 * num_units,)
-        bias_dim = b_r_icfo.shape[0]
-        hidden_size = int(bias_dim / 4)
-        b_r_icfo = np.reshape(b_r_icfo, (1, bias_dim))
-        bias_gates = np.split(b_r_icfo, 4, axis=1)
-        ft_bias = np.add(bias_gates[2], ft_bias_scalar)
-        wb_bias_iofc = np.concatenate((bias_gates[0], bias_gates[3], ft_bias, bias_gates[1]), axis=1)
-
-        # fill Rb with empty since in TF, we have only one bias.
-        rb_bias_iofc = np.zeros((1, bias_dim), dtype=b_dtype)
-        B = np.concatenate((wb_bias_iofc, rb_bias_iofc), axis=1)
-        assert B.shape == (1, 2 * bias_dim)
-
-        [wx, wh] = np.split(w_r_icfo, [-1 * hidden_size])
-        input_size = wx.shape[0]
-        assert wx.shape[0] == input_size
-        assert int(wx.shape[1] / 4) == hidden_size
-
-        # split weight for gates
-        w_gates = np.split(wx, 4, axis=1)
-        new_wx = np.concatenate((w_gates[0], w_gates[3], w_gates[2], w_gates[1]), axis=1)
-
-        h_gates = np.split(wh, 4, axis=1)
-        new_wh = np.concatenate((h_gates[0], h_gates[3], h_gates[2], h_gates[1]), axis=1)
-        W_iofc = np.transpose(new_wx)
-        R_iofc = np.transpose(new_wh)
-
-        W = np.array([W_iofc], w_dtype)
-        R = np.array([R_iofc], w_dtype)
+        W, R, B = get_onnx_lstm_weights(weights["weight"], weights["bias"], weights["ft_bias"])
+        input_size = W.shape[2]
+        hidden_size = R.shape[2]
 
         # create node
         w_name = utils.make_name("W" + str(i))
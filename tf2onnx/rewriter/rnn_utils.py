@@ -361,6 +361,87 @@ def get_weights_from_const_node(g, node):
     return val
 
 
+def get_output_consumers(g):
+    """Map every tensor consumed by a node of g, or of its body graphs, to its consumers, in a single pass."""
+    consumers = defaultdict(list)
+    for node in g.get_nodes():
+        for inp in node.input:
+            consumers[inp].append(node)
+        body_graphs = node.get_body_graphs()
+        if body_graphs:
+            for b_g in body_graphs.values():
+                for inp, nodes in get_output_consumers(b_g).items():
+                    consumers[inp].extend(nodes)
+    return consumers
+
+
+def get_onnx_lstm_weights(w, b, ft_bias):
+    """Convert tf LSTM kernel and bias into W, R and B of onnx LSTM.
+
+    Args:
+        w: kernel of shape (input_size + hidden_size, 4 * hidden_size), gates in icfo order
+        b: bias of shape (4 * hidden_size,), gates in icfo order
+        ft_bias: forget bias added to the forget gate
+
+    Returns:
+        W, R and B for a single direction, gates in iofc order
+    """
+    w_dtype = w.dtype
+    b_dtype = b.dtype
+
+    # split bias for each hidden unit
+    # b_r_icfo: (4 * num_units,)
+    bias_dim = b.shape[0]
+    hidden_size = int(bias_dim / 4)
+    b_r_icfo = np.reshape(b, (1, bias_dim))
+    bias_gates = np.split(b_r_icfo, 4, axis=1)
+    ft_bias = np.add(bias_gates[2], ft_bias)
+    wb_bias_iofc = np.concatenate((bias_gates[0], bias_gates[3], ft_bias, bias_gates[1]), axis=1)
+
+    # fill Rb with empty since in TF, we have only one bias.
+    rb_bias_iofc = np.zeros((1, bias_dim), dtype=b_dtype)
+    B = np.concatenate((wb_bias_iofc, rb_bias_iofc), axis=1)
+    assert B.shape == (1, 2 * bias_dim)
+
+    [wx, wh] = np.split(w, [-1 * hidden_size])
+    assert int(wx.shape[1] / 4) == hidden_size
+
+    # split weight for gates
+    w_gates = np.split(wx, 4, axis=1)
+    new_wx = np.concatenate((w_gates[0], w_gates[3], w_gates[2], w_gates[1]), axis=1)
+
+    h_gates = np.split(wh, 4, axis=1)
+    new_wh = np.concatenate((h_gates[0], h_gates[3], h_gates[2], h_gates[1]), axis=1)
+    W_iofc = np.transpose(new_wx)
+    R_iofc = np.transpose(new_wh)
+
+    W = np.array([W_iofc], w_dtype)
+    R = np.array([R_iofc], w_dtype)
+    return W, R, B
+
+
+def can_convert_lstm_block_cell_to_lstm(cell, consumed_outputs):
+    """Whether the consumed outputs of a LSTMBlockCell can be produced by an onnx LSTM.
+    The weights must be const as well, which is left to the caller.
+    """
+    # clip of onnx LSTM is applied to gate inputs, not to the cell state as tf does
+    if cell.get_attr_value("cell_clip", -1.0) > 0:
+        return False
+
+    # onnx LSTM only produces cs and h, other gates must not be consumed
+    for i in [0, 2, 3, 4, 5]:
+        if cell.output[i] in consumed_outputs:
+            logger.debug("output %s of %s is consumed, cannot use LSTM", i, cell.name)
+            return False
+    return True
+
+
+def get_onnx_lstm_peepholes(wci, wcf, wco):
+    """Convert tf peephole weights of input, forget and output gates into P of onnx LSTM."""
+    # onnx expects peepholes in iof order
+    return np.concatenate([wci, wco, wcf]).reshape([1, -1])
+
+
 ######################################################
 ####      Utilities for bidirectional rnn      #######
 ######################################################